@@ -1,7 +1,12 @@
 
 import sqlite3
 import os
+import gzip
+import shutil
+import tempfile
+import time
 import pandas as pd
+import events
 
 # --- Database Setup ---
 DATABASE_DIR = os.path.join(os.path.dirname(__file__), '..', 'data')
@@ -143,6 +148,80 @@ def seed_from_csv():
                 print(f"Error seeding table for {csv_file}: {e}")
     _populate_whitelists()
 
+# Keep IN (...) lists well below SQLite's bound-parameter limit
+IN_CHUNK_SIZE = 500
+
+def _chunks(items, size=IN_CHUNK_SIZE):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+def _section_scopes(cursor, records):
+    """
+    Look up the sections of every student referenced by records with a single
+    query. Returns a {str(student_id): [section_id, ...]} map.
+    """
+    student_ids = list({r['student_id'] for r in records if r.get('section_id') is None and r.get('student_id') is not None})
+    scopes = {}
+    for chunk in _chunks(student_ids):
+        placeholders = ', '.join(['?' for _ in chunk])
+        cursor.execute(f"SELECT student_id, section_id FROM section_students WHERE student_id IN ({placeholders})", chunk)
+        for row in cursor.fetchall():
+            scopes.setdefault(str(row[0]), []).append(row[1])
+    return scopes
+
+def _change_events(cursor, changes):
+    """
+    Build events for the live /api/events stream from (type, table, record, extra)
+    tuples. Each event carries the rehearsal/sections its row belongs to so that
+    filtered subscribers only receive what they asked for.
+    """
+    scopes = _section_scopes(cursor, [record for _, _, record, _ in changes])
+    built = []
+    for change_type, table_name, record, extra in changes:
+        event = {'type': change_type, 'table': table_name, 'record': record, **extra}
+        if record.get('rehearsal_id') is not None:
+            event['rehearsal_id'] = record['rehearsal_id']
+        if record.get('section_id') is not None:
+            event['section_ids'] = [record['section_id']]
+        elif record.get('student_id') is not None:
+            event['section_ids'] = scopes.get(str(record['student_id']), [])
+        built.append(event)
+    return built
+
+def _publish_changes(cursor, changes, as_batch=False):
+    """
+    Publish change events once a write has been committed. With as_batch the
+    changes go out as one 'batch' event so live clients re-render only once.
+    Failures are only logged, so a notification problem can never fail a write
+    that was saved.
+    """
+    if not changes:
+        return
+    try:
+        built = _change_events(cursor, changes)
+        if as_batch:
+            events.publish({'type': 'batch', 'changes': built})
+        else:
+            for event in built:
+                events.publish(event)
+    except Exception as e:
+        print(f"Warning: could not publish change events: {e}")
+
+def _primary_key(cursor, table_name):
+    """Return the declared single-column primary key of a table, or None."""
+    cursor.execute(f'PRAGMA table_info("{table_name}")')
+    pk_columns = [row['name'] for row in cursor.fetchall() if row['pk']]
+    return pk_columns[0] if len(pk_columns) == 1 else None
+
+def _update_changes(table_name, pk_col, old_rows, new_rows, has_primary_key):
+    """Describe an update as change tuples that live clients can apply."""
+    if has_primary_key:
+        return [('update', table_name, row, {'pk_col': pk_col}) for row in new_rows]
+    # Rows of tables without a primary key (e.g. section_students) are identified
+    # by all of their columns, so send the old rows going away and the new ones arriving
+    return ([('delete', table_name, row, {}) for row in old_rows] +
+            [('insert', table_name, row, {}) for row in new_rows])
+
 def get_all(table_name):
     """Fetch all records from a given table."""
     with get_db_connection() as conn:
@@ -162,9 +241,12 @@ def delete_by_id(table_name, pk_col, pk_val):
     """Delete a record from a table by its primary key."""
     with get_db_connection() as conn:
         cursor = conn.cursor()
-        cursor.execute(f'DELETE FROM {table_name} WHERE "{pk_col}" = ?', (pk_val,))
+        # RETURNING reports every removed row, e.g. all of a student's section mappings
+        cursor.execute(f'DELETE FROM {table_name} WHERE "{pk_col}" = ? RETURNING *', (pk_val,))
+        deleted_rows = [dict(row) for row in cursor.fetchall()]
         conn.commit()
-        return cursor.rowcount > 0 # Return True if a row was deleted
+        _publish_changes(cursor, [('delete', table_name, row, {'pk_col': pk_col}) for row in deleted_rows])
+        return len(deleted_rows) > 0 # Return True if a row was deleted
 
 def update_record(table_name, pk_col, pk_val, record):
     """Update a record in a table."""
@@ -181,11 +263,19 @@ def update_record(table_name, pk_col, pk_val, record):
 
         values.append(pk_val)
 
-        sql = f'UPDATE {table_name} SET {set_clause} WHERE "{pk_col}" = ?'
+        sql = f'UPDATE {table_name} SET {set_clause} WHERE "{pk_col}" = ? RETURNING *'
         
+        has_primary_key = _primary_key(cursor, table_name) is not None
+        old_rows = []
+        if not has_primary_key:
+            cursor.execute(f'SELECT * FROM {table_name} WHERE "{pk_col}" = ?', (pk_val,))
+            old_rows = [dict(row) for row in cursor.fetchall()]
+
         cursor.execute(sql, tuple(values))
+        new_rows = [dict(row) for row in cursor.fetchall()]
         conn.commit()
-        return cursor.rowcount > 0
+        _publish_changes(cursor, _update_changes(table_name, pk_col, old_rows, new_rows, has_primary_key))
+        return len(new_rows) > 0
 
 def add_record(table_name, record):
     """Add a new record to a table and return the new primary key."""
@@ -196,11 +286,14 @@ def add_record(table_name, record):
         placeholders = ', '.join(['?' for _ in record.values()])
         values = tuple(record.values())
 
-        sql = f"INSERT INTO {table_name} ({columns}) VALUES ({placeholders})"
+        sql = f"INSERT INTO {table_name} ({columns}) VALUES ({placeholders}) RETURNING *"
         
         cursor.execute(sql, values)
+        new_row = dict(cursor.fetchone())
+        new_id = cursor.lastrowid
         conn.commit()
-        return cursor.lastrowid
+        _publish_changes(cursor, [('insert', table_name, new_row, {})])
+        return new_id
 
 def add_attendance_records(records, marked_by):
     """Save a batch of attendance records in a single transaction."""
@@ -217,6 +310,7 @@ def add_attendance_records(records, marked_by):
 
             # Determine the save_version for this batch of records
             current_rehearsal_id = records[0].get('rehearsal_id')
+            saved_records = []
             cursor.execute("SELECT MAX(save_version) FROM attendance WHERE rehearsal_id = ?", (current_rehearsal_id,))
             max_version_row = cursor.fetchone()
             max_version = int(max_version_row[0]) if max_version_row and max_version_row[0] is not None else 0
@@ -239,16 +333,36 @@ def add_attendance_records(records, marked_by):
                 values = tuple(full_record.values())
                 sql = f"INSERT INTO attendance ({columns}) VALUES ({placeholders})"
                 cursor.execute(sql, values)
+                saved_records.append({'attendance_id': cursor.lastrowid, **full_record})
             
             # Commit the transaction
             conn.commit()
-            return len(records), new_version
 
         except Exception as e:
             # Rollback in case of error
             conn.rollback()
             raise e
 
+        # Push one event for the whole batch rather than one per student.
+        # The records are already saved, so a failure here is only logged.
+        try:
+            scopes = _section_scopes(cursor, saved_records)
+            record_section_ids = [scopes.get(str(r['student_id']), []) for r in saved_records]
+            events.publish({
+                'type': 'attendance',
+                'table': 'attendance',
+                'rehearsal_id': current_rehearsal_id,
+                'section_ids': sorted({s for section_ids in record_section_ids for s in section_ids}),
+                # Lets section-filtered subscribers receive only their own section's rows
+                'record_section_ids': record_section_ids,
+                'save_version': new_version,
+                'marked_by': marked_by,
+                'records': saved_records
+            })
+        except Exception as e:
+            print(f"Warning: could not publish attendance event: {e}")
+        return len(records), new_version
+
 def get_all_table_names():
     """Fetch all table names from the database."""
     with get_db_connection() as conn:
@@ -272,6 +386,107 @@ def seed_table_from_df(table_name, df):
         except sqlite3.Error:
             pass
     _populate_whitelists()
+    events.publish({'type': 'resync', 'table': table_name})
+
+# Upper limit on how long a snapshot may hold its read transaction
+SNAPSHOT_TIMEOUT_SECONDS = 30
+
+def backup_database(dest_file, timeout=SNAPSHOT_TIMEOUT_SECONDS):
+    """
+    Write a gzip-compressed snapshot of the live database to a file object.
+    VACUUM INTO copies everything from a single read transaction, so unlike the
+    page-stepping backup API it never restarts when another connection commits.
+    Raises ValueError if there is no initialized database and TimeoutError if
+    the copy takes longer than timeout seconds.
+    """
+    if not os.path.exists(DATABASE_PATH):
+        raise ValueError("Database does not exist yet. Run 'init-db' first.")
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        snapshot_path = os.path.join(temp_dir, 'snapshot.db')
+        # Open read-only so a missing file is never silently created
+        src = sqlite3.connect(f"file:{DATABASE_PATH}?mode=ro", uri=True)
+        try:
+            tables = {row[0] for row in src.execute("SELECT name FROM sqlite_master WHERE type='table'")}
+            missing = VALID_TABLE_NAMES - tables
+            if missing:
+                raise ValueError(f"Database is missing tables: {', '.join(sorted(missing))}. Run 'init-db' first.")
+
+            deadline = time.monotonic() + timeout
+            # A non-zero return from the progress handler interrupts the statement
+            src.set_progress_handler(lambda: time.monotonic() > deadline, 10000)
+            try:
+                src.execute("VACUUM INTO ?", (snapshot_path,))
+            except sqlite3.OperationalError as e:
+                if time.monotonic() > deadline:
+                    raise TimeoutError(f"Snapshot did not finish within {timeout} seconds.")
+                raise e
+        finally:
+            src.close()
+
+        with open(snapshot_path, 'rb') as raw, gzip.GzipFile(fileobj=dest_file, mode='wb', compresslevel=6) as gz:
+            shutil.copyfileobj(raw, gz)
+
+def _swap_in_database(new_path):
+    """
+    Atomically replace the live database file with new_path.
+    An exclusive lock on the live database waits out active writers and makes
+    SQLite roll back any leftover hot journal first, so no journal can be
+    replayed onto the restored file.
+    """
+    if not os.path.exists(DATABASE_PATH):
+        os.replace(new_path, DATABASE_PATH)
+        return
+
+    conn = sqlite3.connect(DATABASE_PATH, timeout=10, isolation_level=None)
+    try:
+        conn.execute("BEGIN EXCLUSIVE")
+        leftovers = [suffix for suffix in ('-journal', '-wal') if os.path.exists(DATABASE_PATH + suffix)]
+        if leftovers:
+            raise ValueError(f"Cannot restore while {', '.join('orchestra.db' + s for s in leftovers)} exists.")
+        os.replace(new_path, DATABASE_PATH)
+    except sqlite3.OperationalError as e:
+        raise ValueError(f"Database is busy, try the restore again: {e}")
+    finally:
+        conn.close()
+
+def restore_database(src_file):
+    """
+    Replace the live database with a gzip-compressed snapshot read from a file object.
+    The snapshot is verified before being swapped in atomically with os.replace.
+    """
+    os.makedirs(DATABASE_DIR, exist_ok=True)
+    # The temp file must live next to the database so os.replace stays atomic
+    fd, temp_path = tempfile.mkstemp(prefix='orchestra-restore-', suffix='.db', dir=DATABASE_DIR)
+    try:
+        with os.fdopen(fd, 'wb') as raw:
+            try:
+                with gzip.GzipFile(fileobj=src_file, mode='rb') as gz:
+                    shutil.copyfileobj(gz, raw)
+            except (OSError, EOFError) as e:
+                raise ValueError(f"Snapshot is not a valid gzip file: {e}")
+
+        conn = sqlite3.connect(temp_path)
+        try:
+            result = conn.execute("PRAGMA integrity_check").fetchone()
+            tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type='table'")}
+        except sqlite3.DatabaseError as e:
+            raise ValueError(f"Snapshot is not a valid SQLite database: {e}")
+        finally:
+            conn.close()
+
+        if not result or result[0] != 'ok':
+            raise ValueError("Snapshot failed the SQLite integrity check.")
+        missing = VALID_TABLE_NAMES - tables
+        if missing:
+            raise ValueError(f"Snapshot is missing tables: {', '.join(sorted(missing))}")
+
+        _swap_in_database(temp_path)
+        events.publish({'type': 'resync', 'reason': 'restore'})
+    except Exception:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
 
 def get_user_by_username(username):
     """Fetch a single user by their username."""
@@ -298,14 +513,20 @@ def add_student_with_section(student_record, section_id):
         st_columns = ', '.join([f'"{k}"' for k in student_record.keys()])
         st_placeholders = ', '.join(['?' for _ in student_record.values()])
         st_values = tuple(student_record.values())
-        cursor.execute(f"INSERT INTO students ({st_columns}) VALUES ({st_placeholders})", st_values)
-        new_student_id = cursor.lastrowid
+        cursor.execute(f"INSERT INTO students ({st_columns}) VALUES ({st_placeholders}) RETURNING *", st_values)
+        new_student = dict(cursor.fetchone())
+        new_student_id = new_student['student_id']
 
         # Assign to section
         if section_id:
             cursor.execute("INSERT INTO section_students (student_id, section_id) VALUES (?, ?)", (new_student_id, section_id))
         
         conn.commit()
+
+        changes = [('insert', 'students', new_student, {})]
+        if section_id:
+            changes.append(('insert', 'section_students', {'section_id': section_id, 'student_id': new_student_id}, {}))
+        _publish_changes(cursor, changes)
         return new_student_id
 
 
@@ -313,3 +534,173 @@ def add_student_with_section(student_record, section_id):
 
 
     
+
+# --- Batch Operations ---
+BATCH_OPERATIONS = ('insert', 'update', 'delete')
+# Users are excluded so passwords can never be written without being hashed
+BATCH_EXCLUDED_TABLES = {'users'}
+# Types a batch may write; anything else (lists, objects) is rejected up front
+BATCH_VALUE_TYPES = (str, int, float, bool, type(None))
+
+def _table_columns(cursor, table_name):
+    """Return the column names of a table as defined in the database."""
+    cursor.execute(f'PRAGMA table_info("{table_name}")')
+    return [row['name'] for row in cursor.fetchall()]
+
+def _validate_batch_operation(cursor, index, operation, columns_cache):
+    """
+    Check a single batch operation against the whitelists and the table schema.
+    Returns a normalized (op, table, pk_col, record) tuple or raises ValueError.
+    """
+    if not isinstance(operation, dict):
+        raise ValueError(f"Operation {index}: must be an object.")
+
+    op = operation.get('op')
+    if op not in BATCH_OPERATIONS:
+        raise ValueError(f"Operation {index}: 'op' must be one of {', '.join(BATCH_OPERATIONS)}.")
+
+    table_name = operation.get('table')
+    if not isinstance(table_name, str):
+        raise ValueError(f"Operation {index}: 'table' must be a string.")
+    table_name = os.path.splitext(table_name)[0]
+    if not is_valid_table(table_name) or table_name in BATCH_EXCLUDED_TABLES:
+        raise ValueError(f"Operation {index}: invalid table '{table_name}'.")
+
+    if table_name not in columns_cache:
+        columns_cache[table_name] = _table_columns(cursor, table_name)
+    table_columns = columns_cache[table_name]
+
+    record = operation.get('record') or {}
+    if not isinstance(record, dict):
+        raise ValueError(f"Operation {index}: 'record' must be an object.")
+    record = dict(record)
+
+    pk_col = operation.get('primary_key_col')
+    if op != 'insert':
+        if not isinstance(pk_col, str) or not is_valid_column(pk_col) or pk_col not in table_columns:
+            raise ValueError(f"Operation {index}: invalid primary_key_col '{pk_col}'.")
+        # The key may be given as primary_key_val or inside the record
+        pk_val = record.get(pk_col, operation.get('primary_key_val'))
+        if op == 'delete':
+            record = {pk_col: operation.get('primary_key_val', pk_val)}
+        else:
+            record[pk_col] = pk_val
+        if record.get(pk_col) is None:
+            raise ValueError(f"Operation {index}: missing primary key value.")
+
+    # 'section_id' on a student insert assigns the new student to a section, like add_data
+    extra_columns = {'section_id'} if op == 'insert' and table_name == 'students' else set()
+    for col, value in record.items():
+        if not is_valid_column(col) or (col not in table_columns and col not in extra_columns):
+            raise ValueError(f"Operation {index}: invalid column '{col}' for table '{table_name}'.")
+        if not isinstance(value, BATCH_VALUE_TYPES):
+            raise ValueError(f"Operation {index}: value for '{col}' must be a string, number, boolean or null.")
+
+    written_columns = [c for c in record if c in table_columns and (op == 'insert' or c != pk_col)]
+    if op != 'delete' and not written_columns:
+        raise ValueError(f"Operation {index}: no columns to write.")
+
+    return op, table_name, pk_col, record
+
+def _group_batch_operations(operations):
+    """
+    Split operations into consecutive runs that share the same statement shape,
+    so each run can reuse one prepared statement. Order between runs is preserved.
+    """
+    groups = []
+    for index, (op, table_name, pk_col, record) in enumerate(operations):
+        shape = (op, table_name, pk_col, tuple(record.keys()) if op != 'delete' else ())
+        if groups and groups[-1][0] == shape:
+            groups[-1][1].append((index, record))
+        else:
+            groups.append((shape, [(index, record)]))
+    return groups
+
+def apply_batch(operations):
+    """
+    Apply a list of insert/update/delete operations in a single transaction.
+    Each operation is {'op', 'table', 'record', 'primary_key_col', 'primary_key_val'};
+    for update/delete the key value may be given as primary_key_val or in record.
+    Returns, per operation and in order, the list of rows it inserted, updated
+    or deleted (updates and deletes on a non-unique column may touch several).
+    Raises ValueError and rolls back everything if any operation is invalid or
+    matches no row.
+    """
+    if not isinstance(operations, list) or not operations:
+        raise ValueError("Operations must be a non-empty list.")
+
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("BEGIN TRANSACTION")
+
+        try:
+            columns_cache = {}
+            validated = [_validate_batch_operation(cursor, i, op, columns_cache) for i, op in enumerate(operations)]
+
+            results = [None] * len(validated)
+            changes = []
+            for (op, table_name, pk_col, columns), items in _group_batch_operations(validated):
+                if op == 'insert':
+                    section_mappings = []
+                    row_columns = [c for c in columns if c in columns_cache[table_name]]
+                    quoted = ', '.join([f'"{c}"' for c in row_columns])
+                    placeholders = ', '.join(['?' for _ in row_columns])
+                    sql = f'INSERT INTO {table_name} ({quoted}) VALUES ({placeholders}) RETURNING *'
+                    # sqlite3's executemany discards RETURNING rows, so the same cached
+                    # statement is stepped once per row inside the one transaction
+                    for index, record in items:
+                        cursor.execute(sql, tuple(record[c] for c in row_columns))
+                        row = dict(cursor.fetchone())
+                        results[index] = [row]
+                        changes.append(('insert', table_name, row, {}))
+                        if record.get('section_id'):
+                            section_mappings.append((record['section_id'], row['student_id']))
+                    if section_mappings:
+                        cursor.executemany("INSERT INTO section_students (section_id, student_id) VALUES (?, ?)", section_mappings)
+                        for section_id, student_id in section_mappings:
+                            changes.append(('insert', 'section_students', {'section_id': section_id, 'student_id': student_id}, {}))
+
+                elif op == 'update':
+                    has_primary_key = _primary_key(cursor, table_name) is not None
+                    set_columns = [c for c in columns if c != pk_col]
+                    set_clause = ', '.join([f'"{c}" = ?' for c in set_columns])
+                    sql = f'UPDATE {table_name} SET {set_clause} WHERE "{pk_col}" = ? RETURNING *'
+                    for index, record in items:
+                        old_rows = []
+                        if not has_primary_key:
+                            cursor.execute(f'SELECT * FROM {table_name} WHERE "{pk_col}" = ?', (record[pk_col],))
+                            old_rows = [dict(row) for row in cursor.fetchall()]
+                        cursor.execute(sql, tuple(record[c] for c in set_columns) + (record[pk_col],))
+                        new_rows = [dict(row) for row in cursor.fetchall()]
+                        if not new_rows:
+                            raise ValueError(f"Operation {index}: record to update not found.")
+                        results[index] = new_rows
+                        changes.extend(_update_changes(table_name, pk_col, old_rows, new_rows, has_primary_key))
+
+                else: # delete
+                    keys = [str(record[pk_col]) for _, record in items]
+                    seen = set()
+                    for (index, _), key in zip(items, keys):
+                        if key in seen:
+                            raise ValueError(f"Operation {index}: the same record is deleted more than once.")
+                        seen.add(key)
+                    deleted_rows = {}
+                    for chunk in _chunks([record[pk_col] for _, record in items]):
+                        placeholders = ', '.join(['?' for _ in chunk])
+                        cursor.execute(f'DELETE FROM {table_name} WHERE "{pk_col}" IN ({placeholders}) RETURNING *', chunk)
+                        for row in cursor.fetchall():
+                            deleted_rows.setdefault(str(row[pk_col]), []).append(dict(row))
+                    for (index, record), key in zip(items, keys):
+                        rows = deleted_rows.get(key)
+                        if not rows:
+                            raise ValueError(f"Operation {index}: record to delete not found.")
+                        results[index] = rows
+                        changes.extend(('delete', table_name, row, {'pk_col': pk_col}) for row in rows)
+
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+        _publish_changes(cursor, changes, as_batch=True)
+        return results
@@ -0,0 +1,116 @@
+import collections
+import contextvars
+import itertools
+import json
+import threading
+
+# --- Live Change Events ---
+# Small in-process pub/sub used to push database changes to connected
+# clients over Server-Sent Events (see /api/events in server.py).
+
+# How many undelivered events a single client may have queued before it is
+# considered too slow. Its backlog is then dropped and replaced by a 'resync'.
+MAX_PENDING_EVENTS = 100
+# Seconds between keepalive comments on an idle stream
+KEEPALIVE_SECONDS = 15
+
+_subscribers = set()
+_subscribers_lock = threading.Lock()
+_event_ids = itertools.count(1)
+# Id of the browser session whose request is being handled (X-Client-Id header).
+# It is attached to published events so a client can recognize its own writes.
+_current_origin = contextvars.ContextVar('event_origin', default=None)
+
+
+class Subscriber:
+    """A single client connection with optional rehearsal/section filters."""
+
+    def __init__(self, rehearsal_id=None, section_id=None, max_pending=MAX_PENDING_EVENTS):
+        self.rehearsal_id = str(rehearsal_id) if rehearsal_id else None
+        self.section_id = str(section_id) if section_id else None
+        self.max_pending = max_pending
+        self.pending = collections.deque()
+        self.condition = threading.Condition()
+
+    def matches(self, event):
+        """
+        Check whether an event falls inside this subscriber's filters.
+        Events without rehearsal/section scope (e.g. a renamed section) always match.
+        A batch matches if any of its changes does.
+        """
+        if event.get('type') == 'batch':
+            return any(self.matches(change) for change in event.get('changes', []))
+        if self.rehearsal_id and event.get('rehearsal_id') is not None:
+            if str(event['rehearsal_id']) != self.rehearsal_id:
+                return False
+        if self.section_id and event.get('section_ids') is not None:
+            if self.section_id not in [str(s) for s in event['section_ids']]:
+                return False
+        return True
+
+    def narrow(self, event):
+        """
+        Trim a multi-record event to the records inside this subscriber's section
+        filter. Per-record scopes travel in 'record_section_ids' and are not sent on.
+        """
+        record_section_ids = event.get('record_section_ids')
+        if record_section_ids is None:
+            return event
+        event = {k: v for k, v in event.items() if k != 'record_section_ids'}
+        if self.section_id:
+            event['records'] = [
+                record for record, section_ids in zip(event['records'], record_section_ids)
+                if self.section_id in [str(s) for s in section_ids]
+            ]
+        return event
+
+    def push(self, event_id, event):
+        """Queue an event without ever blocking the writer that published it."""
+        with self.condition:
+            if len(self.pending) >= self.max_pending:
+                # The client is not keeping up; drop its backlog and tell it to refetch
+                self.pending.clear()
+                self.pending.append((event_id, {'type': 'resync', 'reason': 'overflow'}))
+            else:
+                self.pending.append((event_id, event))
+            self.condition.notify()
+
+    def next_event(self, timeout=KEEPALIVE_SECONDS):
+        """Wait for the next queued event. Returns None if the timeout expires."""
+        with self.condition:
+            if not self.pending:
+                self.condition.wait(timeout)
+            return self.pending.popleft() if self.pending else None
+
+
+def subscribe(rehearsal_id=None, section_id=None):
+    """Register a new subscriber and return it."""
+    subscriber = Subscriber(rehearsal_id, section_id)
+    with _subscribers_lock:
+        _subscribers.add(subscriber)
+    return subscriber
+
+def unsubscribe(subscriber):
+    """Remove a subscriber, e.g. after its client disconnected."""
+    with _subscribers_lock:
+        _subscribers.discard(subscriber)
+
+def set_origin(origin):
+    """Set the client id attached to events published by the current request."""
+    _current_origin.set(origin)
+
+def publish(event):
+    """Deliver an event to every subscriber whose filters match it."""
+    event_id = next(_event_ids)
+    origin = _current_origin.get()
+    if origin:
+        event = {**event, 'origin': origin}
+    with _subscribers_lock:
+        targets = [s for s in _subscribers if s.matches(event)]
+    for subscriber in targets:
+        subscriber.push(event_id, subscriber.narrow(event))
+
+def format_sse(event_id, event):
+    """Serialize an event in the text/event-stream wire format."""
+    payload = json.dumps(event, ensure_ascii=False, default=str)
+    return f"id: {event_id}\ndata: {payload}\n\n"
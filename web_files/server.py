@@ -1,7 +1,8 @@
-from flask import Flask, render_template, jsonify, request, send_file
+from flask import Flask, render_template, jsonify, request, send_file, Response
 import io
 import os
 import database
+import events
 import pandas as pd
 import zipfile
 import tempfile
@@ -81,7 +82,59 @@ def import_csv():
             return jsonify({"error": "An error occurred during CSV import."}), 500
     else:
         return jsonify({"error": "Invalid file type, please upload a .zip file"}), 400
+
+
+@app.route('/api/snapshot', methods=['GET', 'POST'])
+def handle_snapshot():
+    """Export or restore a compressed binary snapshot of the whole database."""
+    if request.method == 'POST':
+        return restore_snapshot()
+    try:
+        buffer = io.BytesIO()
+        database.backup_database(buffer)
+        buffer.seek(0)
+        return send_file(
+            buffer,
+            as_attachment=True,
+            download_name='orchestra_snapshot.db.gz',
+            mimetype='application/gzip'
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except TimeoutError as e:
+        return jsonify({"error": str(e)}), 503
+    except Exception as e:
+        print(f"Error creating snapshot: {e}")
+        return jsonify({"error": "An error occurred while creating the snapshot."}), 500
+
+
+def restore_snapshot():
+    if 'file' not in request.files:
+        return jsonify({"error": "No file part in the request"}), 400
+
+    file = request.files['file']
+    if file.filename == '':
+        return jsonify({"error": "No file selected for uploading"}), 400
+
+    try:
+        database.restore_database(file.stream)
+        return jsonify({"success": True, "message": "Snapshot restored successfully."})
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        print(f"Error restoring snapshot: {e}")
+        return jsonify({"error": "An error occurred while restoring the snapshot."}), 500
 		
+@app.before_request
+def tag_event_origin():
+    """Remember which browser session made this request for live change events."""
+    events.set_origin(request.headers.get('X-Client-Id'))
+
+
+@app.teardown_request
+def clear_event_origin(exc=None):
+    events.set_origin(None)
+
 @app.route('/')
 def index():
     return render_template('index.html')
@@ -168,6 +221,39 @@ def save_attendance():
         return jsonify({"error": "An error occurred while saving data."}), 500
 
 
+@app.route('/api/events')
+def stream_events():
+    """
+    Server-Sent Events stream of database changes.
+    Optional ?rehearsal_id= and ?section_id= query parameters narrow what is pushed.
+    """
+    subscriber = events.subscribe(
+        rehearsal_id=request.args.get('rehearsal_id'),
+        section_id=request.args.get('section_id')
+    )
+
+    def generate():
+        try:
+            # Ask the browser to reconnect after 3 seconds if the stream drops
+            yield "retry: 3000\n\n"
+            while True:
+                item = subscriber.next_event(timeout=events.KEEPALIVE_SECONDS)
+                if item is None:
+                    # Comment line keeps proxies from closing an idle stream
+                    # and lets us notice clients that have gone away
+                    yield ": keepalive\n\n"
+                else:
+                    yield events.format_sse(*item)
+        finally:
+            events.unsubscribe(subscriber)
+
+    return Response(
+        generate(),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+
 @app.route('/api/update_data', methods=['POST'])
 def update_data():
     """
@@ -273,6 +359,32 @@ def add_data():
         return jsonify({"error": "An error occurred while adding data."}), 500
 
 
+@app.route('/api/batch', methods=['POST'])
+def batch_data():
+    """
+    Applies a list of insert/update/delete operations in a single transaction.
+    Each operation is {"op", "table", "record", "primary_key_col", "primary_key_val"};
+    for update/delete the key value may be given as primary_key_val or in record.
+    Returns, for every operation in request order, the list of rows it affected.
+    """
+    payload = request.get_json(silent=True)
+    if not isinstance(payload, dict):
+        return jsonify({"error": "Request body must be a JSON object"}), 400
+    operations = payload.get('operations')
+
+    if not operations:
+        return jsonify({"error": "No operations provided"}), 400
+
+    try:
+        results = database.apply_batch(operations)
+        return jsonify({"success": True, "message": f"Successfully applied {len(results)} operations.", "results": results})
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        print(f"Error applying batch: {e}")
+        return jsonify({"error": "An error occurred while applying the batch."}), 500
+
+
 def main():
     """
     Main function to run the Flask application.
@@ -294,6 +406,35 @@ if __name__ == '__main__':
         database.db_init()
         print("Exiting after database initialization.")
         sys.exit(0)
+
+    if len(sys.argv) > 1 and sys.argv[1] in ('snapshot', 'restore') and len(sys.argv) < 3:
+        print(f"Usage: python3 server.py {sys.argv[1]} <snapshot-file.db.gz>")
+        sys.exit(2)
+
+    if len(sys.argv) > 2 and sys.argv[1] == 'snapshot':
+        # Write a compressed snapshot of the database to the given path
+        try:
+            with open(sys.argv[2], 'wb') as f:
+                database.backup_database(f)
+        except (ValueError, TimeoutError, OSError) as e:
+            # Don't leave a partial snapshot behind
+            if os.path.exists(sys.argv[2]):
+                os.remove(sys.argv[2])
+            print(f"Snapshot failed: {e}")
+            sys.exit(1)
+        print(f"Snapshot written to {sys.argv[2]}")
+        sys.exit(0)
+
+    if len(sys.argv) > 2 and sys.argv[1] == 'restore':
+        # Replace the database with a previously written snapshot
+        try:
+            with open(sys.argv[2], 'rb') as f:
+                database.restore_database(f)
+        except (ValueError, OSError) as e:
+            print(f"Restore failed: {e}")
+            sys.exit(1)
+        print(f"Database restored from {sys.argv[2]}")
+        sys.exit(0)
     
     # If no special command, run the web server
     main()
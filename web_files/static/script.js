@@ -10,6 +10,12 @@ const store = {
     currentUser: null
 };
 let listenersInitialized = false;
+let eventSource = null;
+// Identifies this browser session so live events caused by our own writes can be recognized
+const clientId = (window.crypto && crypto.randomUUID) ? crypto.randomUUID() : `${Date.now()}-${Math.random().toString(36).slice(2)}`;
+let resyncTimer = null;
+// Data tables whose re-render was skipped because the user was editing them
+const staleTables = new Set();
 
 // =================================================================
 // Message / Toast Notification System
@@ -143,37 +149,8 @@ function handleLogout() {
  */
 async function startApp() {
     console.log("startApp initiated.");
-    // Fetch all necessary data in parallel for faster loading
-    await Promise.all([
-        fetchData('/api/students', 'students'),
-        fetchData('/api/sections', 'sections'),
-        fetchData('/api/rehearsals', 'rehearsals'),
-        fetchData('/api/section_students', 'section_students'),
-        fetchData('/api/attendance', 'attendance')
-    ]);
-    console.log("All data fetched.");
-
-    normalizeStoreIds();
-
-    // Augment student data with their sections for display
-    const augmentedStudents = store.students.map(student => {
-        const studentSections = store.section_students
-            .filter(mapping => mapping.student_id === student.student_id)
-            .map(mapping => store.sections.find(s => s.section_id === mapping.section_id)?.section_name)
-            .filter(name => name)
-            .join(', ');
-        return { ...student, part: studentSections || 'N/A' };
-    });
-
-    // Populate the static display tables at the bottom of the page
-    displayTable(augmentedStudents, 'students-table', ['student_id', 'name', 'part', 'contact', 'join_date', 'status'], 'student_id');
-    displayTable(store.sections, 'sections-table', ['section_id', 'section_name'], 'section_id');
-    displayTable(store.rehearsals, 'rehearsals-table', ['rehearsal_id', 'date', 'location', 'description'], 'rehearsal_id');
-    
-    // Populate the dropdowns for the attendance checker
-    populateDropdown('rehearsal-select', store.rehearsals, 'rehearsal_id', 'date');
-    populateDropdown('section-select', store.sections, 'section_id', 'section_name', true);
-    setupReportTarget(); // Ensure report targets reflect latest data
+    await loadAllData();
+    renderDataViews();
     await ensureTodayRehearsalSelected();
     renderAttendanceList(); // Show initial list without extra clicks
 
@@ -228,6 +205,14 @@ async function startApp() {
     document.getElementById('import-csv-btn').addEventListener('click', handleImportCSV);
     document.getElementById('import-csv-input').addEventListener('change', handleImportFileSelect);
 
+    // Initialize Snapshot Backup/Restore Buttons
+    document.getElementById('export-snapshot-btn').addEventListener('click', handleExportSnapshot);
+    document.getElementById('import-snapshot-btn').addEventListener('click', () => document.getElementById('import-snapshot-input').click());
+    document.getElementById('import-snapshot-input').addEventListener('change', handleImportSnapshotSelect);
+
+    // Subscribe to live changes made by other instructors
+    connectEventStream();
+
     listenersInitialized = true;
 }
 
@@ -313,6 +298,74 @@ async function handleImportFileSelect(event) {
 }
 
 
+/**
+ * Handles the click event for the 'Snapshot Backup' button.
+ * Downloads a compressed binary snapshot of the whole database.
+ */
+async function handleExportSnapshot() {
+    show_toast_message('스냅샷 백업을 시작합니다...', 'info');
+    try {
+        const response = await fetch('/api/snapshot', { cache: 'no-store' });
+        if (!response.ok) {
+            throw new Error('서버에서 스냅샷을 생성하지 못했습니다.');
+        }
+        const blob = await response.blob();
+        const url = window.URL.createObjectURL(blob);
+        const a = document.createElement('a');
+        a.style.display = 'none';
+        a.href = url;
+        a.download = 'orchestra_snapshot.db.gz';
+        document.body.appendChild(a);
+        a.click();
+        window.URL.revokeObjectURL(url);
+        a.remove();
+        show_toast_message('스냅샷이 성공적으로 저장되었습니다.', 'success');
+    } catch (error) {
+        console.error('Error exporting snapshot:', error);
+        show_toast_message(`스냅샷 백업 실패: ${error.message}`, 'error');
+    }
+}
+
+/**
+ * Handles the file selection for snapshot restore.
+ * Uploads the snapshot file to the server, which swaps it in for the live database.
+ */
+async function handleImportSnapshotSelect(event) {
+    const file = event.target.files[0];
+    if (!file) return;
+
+    if (!confirm(`정말로 스냅샷을 복원하시겠습니까? 현재 데이터베이스 전체가 스냅샷 내용으로 대체됩니다. 이 작업은 되돌릴 수 없습니다.`)) {
+        show_toast_message('복원이 취소되었습니다.', 'info');
+        event.target.value = '';
+        return;
+    }
+
+    const formData = new FormData();
+    formData.append('file', file);
+
+    show_toast_message('스냅샷 복원을 시작합니다...', 'info');
+
+    try {
+        const response = await fetch('/api/snapshot', {
+            method: 'POST',
+            body: formData,
+        });
+
+        const result = await response.json();
+        if (!response.ok) {
+            throw new Error(result.error || '서버에서 파일 처리 실패');
+        }
+
+        show_toast_message('스냅샷을 성공적으로 복원했습니다. 앱을 다시 로드합니다.', 'success');
+        await startApp();
+
+    } catch (error) {
+        console.error('Error restoring snapshot:', error);
+        show_toast_message(`복원 실패: ${error.message}`, 'error');
+    } finally {
+        event.target.value = '';
+    }
+}
 
 // =================================================================
 // 3. Data Fetching
@@ -337,6 +390,23 @@ async function fetchData(apiUrl, storeKey) {
     }
 }
 
+/**
+ * Fetches every table the UI needs into the global store.
+ */
+async function loadAllData() {
+    // Fetch all necessary data in parallel for faster loading
+    await Promise.all([
+        fetchData('/api/students', 'students'),
+        fetchData('/api/sections', 'sections'),
+        fetchData('/api/rehearsals', 'rehearsals'),
+        fetchData('/api/section_students', 'section_students'),
+        fetchData('/api/attendance', 'attendance')
+    ]);
+    console.log("All data fetched.");
+
+    normalizeStoreIds();
+}
+
 /**
  * Normalize ID fields to strings to avoid type mismatch (DB returns numbers).
  */
@@ -395,6 +465,75 @@ function showDataScreen(screenId) {
     }
 }
 
+/**
+ * Re-renders the data tables and dropdowns from the current store,
+ * keeping whatever the user had selected in the dropdowns.
+ * A table with a row open for editing or adding is left alone and marked
+ * stale; it is redrawn by flushStaleTables() once the edit ends.
+ */
+function renderDataViews() {
+    const selectIds = ['rehearsal-select', 'section-select', 'report-target-select'];
+    const previousValues = selectIds.map(id => document.getElementById(id).value);
+
+    const tableRenderers = {
+        'students-table': () => {
+            // Augment student data with their sections for display
+            const augmentedStudents = store.students.map(student => {
+                const studentSections = store.section_students
+                    .filter(mapping => mapping.student_id === student.student_id)
+                    .map(mapping => store.sections.find(s => s.section_id === mapping.section_id)?.section_name)
+                    .filter(name => name)
+                    .join(', ');
+                return { ...student, part: studentSections || 'N/A' };
+            });
+            displayTable(augmentedStudents, 'students-table', ['student_id', 'name', 'part', 'contact', 'join_date', 'status'], 'student_id');
+        },
+        'sections-table': () => displayTable(store.sections, 'sections-table', ['section_id', 'section_name'], 'section_id'),
+        'rehearsals-table': () => displayTable(store.rehearsals, 'rehearsals-table', ['rehearsal_id', 'date', 'location', 'description'], 'rehearsal_id')
+    };
+
+    // Populate the static display tables at the bottom of the page
+    Object.entries(tableRenderers).forEach(([tableId, render]) => {
+        if (isTableBeingEdited(tableId)) {
+            staleTables.add(tableId);
+            return;
+        }
+        staleTables.delete(tableId);
+        render();
+    });
+    
+    // Populate the dropdowns for the attendance checker
+    populateDropdown('rehearsal-select', store.rehearsals, 'rehearsal_id', 'date');
+    populateDropdown('section-select', store.sections, 'section_id', 'section_name', true);
+    setupReportTarget(); // Ensure report targets reflect latest data
+
+    selectIds.forEach((id, i) => {
+        const select = document.getElementById(id);
+        if (previousValues[i] && [...select.options].some(opt => opt.value === previousValues[i])) {
+            select.value = previousValues[i];
+        }
+    });
+}
+
+/**
+ * Checks whether a data table has a row being added or edited.
+ * @param {string} tableId - The ID of the div element holding the table.
+ */
+function isTableBeingEdited(tableId) {
+    const tableContainer = document.getElementById(tableId);
+    if (tableContainer.querySelector('.new-row')) return true;
+    return [...tableContainer.querySelectorAll('.save-btn')].some(btn => btn.style.display !== 'none');
+}
+
+/**
+ * Redraws tables whose live updates were held back while they were being edited.
+ */
+function flushStaleTables() {
+    if (staleTables.size > 0) {
+        renderDataViews();
+    }
+}
+
 /**
  * Displays data from a data array in a specified HTML table.
  * @param {Object[]} data - The array of data objects to display.
@@ -516,7 +655,7 @@ async function ensureTodayRehearsalSelected() {
         };
         const response = await fetch('/api/add_data', {
             method: 'POST',
-            headers: { 'Content-Type': 'application/json' },
+            headers: { 'Content-Type': 'application/json', 'X-Client-Id': clientId },
             body: JSON.stringify(payload)
         });
         const result = await response.json();
@@ -665,7 +804,7 @@ async function handleSaveClick(event, storeKey, primaryKey) {
     try {
         const response = await fetch('/api/update_data', {
             method: 'POST',
-            headers: { 'Content-Type': 'application/json' },
+            headers: { 'Content-Type': 'application/json', 'X-Client-Id': clientId },
             body: JSON.stringify(payload),
             cache: 'no-store'
         });
@@ -686,7 +825,7 @@ async function handleSaveClick(event, storeKey, primaryKey) {
         row.querySelector('.save-btn').style.display = 'none';
         
         show_toast_message(result.message || '성공적으로 수정되었습니다!', 'success');
-        await startApp(); // Refresh data and UI with latest values
+        await refreshAfterWrite(); // Refresh data and UI with latest values
         
     } catch (error) {
         console.error('Error saving data:', error);
@@ -725,7 +864,7 @@ async function handleDeleteClick(event, storeKey, primaryKey) {
     try {
         const response = await fetch('/api/delete_data', {
             method: 'POST',
-            headers: { 'Content-Type': 'application/json' },
+            headers: { 'Content-Type': 'application/json', 'X-Client-Id': clientId },
             body: JSON.stringify(payload),
             cache: 'no-store'
         });
@@ -742,7 +881,7 @@ async function handleDeleteClick(event, storeKey, primaryKey) {
         
         show_toast_message(result.message || '성공적으로 삭제되었습니다!', 'success');
         // Refresh the global store and re-render all tables that might be affected
-        await startApp(); // Refresh data and UI
+        await refreshAfterWrite();
 
     } catch (error) {
         console.error('Error deleting data:', error);
@@ -826,7 +965,10 @@ function handleAddClick(event) {
     newRow.innerHTML = rowHtml;
 
     newRow.querySelector('.save-new-btn').addEventListener('click', (e) => handleSaveNewClick(e, tableType, config.pk));
-    newRow.querySelector('.cancel-add-btn').addEventListener('click', () => newRow.remove());
+    newRow.querySelector('.cancel-add-btn').addEventListener('click', () => {
+        newRow.remove();
+        flushStaleTables();
+    });
 }
 
 /**
@@ -865,7 +1007,7 @@ async function handleSaveNewClick(event, storeKey, primaryKey) {
     try {
         const response = await fetch('/api/add_data', {
             method: 'POST',
-            headers: { 'Content-Type': 'application/json' },
+            headers: { 'Content-Type': 'application/json', 'X-Client-Id': clientId },
             body: JSON.stringify(payload)
         });
 
@@ -873,7 +1015,8 @@ async function handleSaveNewClick(event, storeKey, primaryKey) {
         if (!response.ok) throw new Error(result.error || 'Failed to add data.');
 
         show_toast_message('성공적으로 추가되었습니다.', 'success');
-        await startApp(); // Refresh data and UI
+        row.remove(); // The saved row arrives through the refresh below
+        await refreshAfterWrite();
 
     } catch (error) {
         console.error('Error adding data:', error);
@@ -935,7 +1078,7 @@ async function saveAttendance() {
     try {
         const response = await fetch('/api/attendance', {
             method: 'POST',
-            headers: { 'Content-Type': 'application/json' },
+            headers: { 'Content-Type': 'application/json', 'X-Client-Id': clientId },
             body: JSON.stringify(payload),
         });
         const result = await response.json();
@@ -944,7 +1087,7 @@ async function saveAttendance() {
         statusEl.textContent = result.message || '성공적으로 저장되었습니다!';
         statusEl.style.color = 'green';
         
-        await startApp(); // Refresh data and IDs after save
+        await refreshAfterWrite(); // Refresh data and IDs after save
         document.getElementById('attendance-list-container').innerHTML = '';
         document.getElementById('save-attendance-btn').style.display = 'none';
 
@@ -1053,3 +1196,174 @@ function generateReport() {
     }
     resultsContainer.innerHTML = resultsHtml;
 }
+
+
+// =================================================================
+// 7. Live Updates (Server-Sent Events)
+// =================================================================
+
+const LIVE_PRIMARY_KEYS = {
+    students: ['student_id'],
+    sections: ['section_id'],
+    rehearsals: ['rehearsal_id'],
+    section_students: ['section_id', 'student_id'],
+    attendance: ['attendance_id']
+};
+
+/**
+ * Opens the /api/events stream. The browser reconnects on its own if it drops;
+ * after a reconnect we resync once since events may have been missed meanwhile.
+ */
+function connectEventStream() {
+    if (eventSource || typeof EventSource === 'undefined') return;
+
+    let hasConnected = false;
+    eventSource = new EventSource('/api/events');
+    eventSource.addEventListener('open', () => {
+        if (hasConnected) {
+            scheduleResync();
+        }
+        hasConnected = true;
+    });
+    eventSource.addEventListener('message', (message) => {
+        try {
+            applyChangeEvent(JSON.parse(message.data));
+        } catch (error) {
+            console.error('Error applying live update:', error);
+        }
+    });
+}
+
+/**
+ * After a write, rely on the live stream to patch the store when it is connected
+ * (redrawing any table held back during the edit); otherwise refetch everything.
+ */
+async function refreshAfterWrite() {
+    if (eventSource && eventSource.readyState === EventSource.OPEN) {
+        // Our own change event may have arrived while the row was still in edit mode
+        flushStaleTables();
+        return;
+    }
+    await startApp();
+}
+
+/**
+ * Refetch all tables once, coalescing bursts of resync requests (e.g. a CSV import
+ * that replaces several tables in a row).
+ */
+function scheduleResync() {
+    clearTimeout(resyncTimer);
+    resyncTimer = setTimeout(async () => {
+        await loadAllData();
+        renderDataViews();
+        rerenderAttendanceListKeepingMarks();
+    }, 300);
+}
+
+/**
+ * Patches the local store with a single change event pushed by the server.
+ */
+function applyChangeEvent(event) {
+    if (event.type === 'resync') {
+        scheduleResync();
+        return;
+    }
+
+    if (event.type === 'batch') {
+        event.changes.forEach(change => patchStore(change));
+        normalizeStoreIds();
+        renderDataViews();
+        rerenderAttendanceListKeepingMarks();
+        return;
+    }
+
+    if (event.type === 'attendance') {
+        upsertStoreRows('attendance', event.records);
+        normalizeStoreIds();
+        applyRemoteAttendance(event);
+        return;
+    }
+
+    if (!patchStore(event)) return;
+    normalizeStoreIds();
+
+    if (event.table !== 'attendance') {
+        renderDataViews();
+        rerenderAttendanceListKeepingMarks();
+    }
+}
+
+/**
+ * Applies a single-row insert/update/delete event to the store.
+ * Returns false if the table is not one the UI keeps locally.
+ */
+function patchStore(event) {
+    const storeKey = event.table;
+    if (!LIVE_PRIMARY_KEYS[storeKey]) return false;
+
+    if (event.type === 'delete') {
+        const keys = LIVE_PRIMARY_KEYS[storeKey];
+        store[storeKey] = store[storeKey].filter(row => !keys.every(k => String(row[k]) === String(event.record[k])));
+    } else {
+        upsertStoreRows(storeKey, [event.record]);
+    }
+    return true;
+}
+
+/**
+ * Inserts rows into the store, replacing any existing row with the same key.
+ */
+function upsertStoreRows(storeKey, rows) {
+    const keys = LIVE_PRIMARY_KEYS[storeKey];
+    rows.forEach(row => {
+        const index = store[storeKey].findIndex(existing => keys.every(k => String(existing[k]) === String(row[k])));
+        if (index >= 0) {
+            store[storeKey][index] = row;
+        } else {
+            store[storeKey].push(row);
+        }
+    });
+}
+
+/**
+ * Reflects attendance saved by another instructor in the open attendance list.
+ */
+function applyRemoteAttendance(event) {
+    if (event.origin === clientId) return; // Our own save
+
+    const currentRehearsalId = document.getElementById('rehearsal-select').value;
+    if (String(event.rehearsal_id) !== currentRehearsalId) return;
+
+    event.records.forEach(record => {
+        const radio = document.getElementById(`status_${record.status}_${record.student_id}`);
+        if (radio) {
+            radio.checked = true;
+        }
+    });
+    show_toast_message(`${event.marked_by} 님이 출석 기록을 저장했습니다 (버전 ${event.save_version}).`, 'info');
+}
+
+/**
+ * Re-renders the attendance list without losing the statuses the user has already ticked.
+ */
+function rerenderAttendanceListKeepingMarks() {
+    const container = document.getElementById('attendance-list-container');
+    if (!container.querySelector('tr[data-student-id]')) return; // Nothing open to refresh
+
+    const marks = {};
+    container.querySelectorAll('tr[data-student-id]').forEach(row => {
+        const checked = row.querySelector(`input[name="status_${row.dataset.studentId}"]:checked`);
+        if (checked) {
+            marks[row.dataset.studentId] = checked.value;
+        }
+    });
+
+    renderAttendanceList();
+
+    Object.entries(marks).forEach(([studentId, status]) => {
+        const radio = document.getElementById(`status_${status}_${studentId}`);
+        if (radio) {
+            radio.checked = true;
+        }
+    });
+}